@@ -1,5 +1,6 @@
-from flask import Flask, render_template, request, send_file, redirect, url_for, flash, session
+from flask import Flask, render_template, request, redirect, url_for, flash, session
 from io import BytesIO
+from reportlab import rl_config
 from reportlab.lib.pagesizes import A4
 from reportlab.lib import colors
 from reportlab.lib.units import mm
@@ -7,8 +8,14 @@ from reportlab.platypus import Table, TableStyle, Paragraph, SimpleDocTemplate,
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.enums import TA_CENTER
 from werkzeug.security import generate_password_hash, check_password_hash
+from werkzeug.utils import send_file as werkzeug_send_file
+from urllib.parse import quote
 from openpyxl import Workbook
-import datetime, os, json, re, functools, csv
+from PIL import Image as PILImage
+import datetime, os, json, re, functools, csv, tempfile
+
+# Write PDF streams as raw Flate-compressed binary instead of ASCII85 text (~25% smaller)
+rl_config.useA85 = 0
 
 app = Flask(__name__)
 app.secret_key = "replace-this-with-a-random-secret"
@@ -18,6 +25,22 @@ BASE_DIR = os.path.dirname(__file__)
 DATA_DIR = os.path.join(BASE_DIR, "invoices")
 UPLOAD_DIR = os.path.join(BASE_DIR, "static", "uploads")
 DEFAULT_LOGO_PATH = os.path.join(UPLOAD_DIR, "logo.png")
+# Right-sized copy of the logo that invoices actually embed (see prepared_logo_path)
+PRINT_LOGO_PATH = os.path.join(UPLOAD_DIR, "logo.print.png")
+LOGO_BOX = (40*mm, 15*mm)
+LOGO_DPI = 300
+
+# How stored PDFs / CSVs / XLSX files reach the client:
+#   "sendfile"         - worker hands the open file to wsgi.file_wrapper (gunicorn uses os.sendfile)
+#   "x-sendfile"       - empty response with X-Sendfile header, front proxy (Apache/lighttpd) sends the file
+#   "x-accel-redirect" - empty response with X-Accel-Redirect header, nginx serves it from an internal location
+FILE_DELIVERY_MODES = ("sendfile", "x-sendfile", "x-accel-redirect")
+FILE_DELIVERY = os.environ.get("BRANDO_FILE_DELIVERY", "sendfile").lower()
+if FILE_DELIVERY not in FILE_DELIVERY_MODES:
+    raise ValueError(f"BRANDO_FILE_DELIVERY must be one of {', '.join(FILE_DELIVERY_MODES)}, got {FILE_DELIVERY!r}")
+# nginx internal location that maps onto DATA_DIR, e.g.
+#   location /protected/ { internal; alias /app/invoices/; }
+X_ACCEL_PREFIX = os.environ.get("BRANDO_X_ACCEL_PREFIX", "/protected/")
 
 LOADSHEETS_DIR = os.path.join(DATA_DIR, "loadsheets")
 def loadsheets_index_path(username):
@@ -137,7 +160,7 @@ def generate_loadsheet_files(username, invoice_rows, ls_code=None):
     wb.save(xlsx_path)
     # PDF (6 columns: Invoice, Customer, Phone, Address, Total, Created)
     buf = BytesIO()
-    doc = SimpleDocTemplate(buf, pagesize=A4, rightMargin=24, leftMargin=24, topMargin=24, bottomMargin=24)
+    doc = SimpleDocTemplate(buf, pagesize=A4, rightMargin=24, leftMargin=24, topMargin=24, bottomMargin=24, pageCompression=1)
     styles = getSampleStyleSheet()
     title_txt = f"Load Sheet {'['+ls_code+'] ' if ls_code else ''}— {username}"
     title = Paragraph(f"<para align='center'><b>{title_txt}</b></para>", styles['Title'])
@@ -192,6 +215,27 @@ def generate_loadsheet_files(username, invoice_rows, ls_code=None):
         f.write(buf.getbuffer())
     return {"id": base_name, "csv_path": csv_path, "xlsx_path": xlsx_path, "pdf_path": pdf_path}
 
+def deliver_file(path, **kwargs):
+    # Send a stored file after the caller has done its auth checks; see FILE_DELIVERY
+    path = os.path.abspath(path)
+    mode = FILE_DELIVERY
+    data_dir = os.path.abspath(DATA_DIR)
+    if mode == "x-accel-redirect" and os.path.commonpath([path, data_dir]) != data_dir:
+        # nginx only maps DATA_DIR (e.g. load sheets recorded before the app moved); serve it ourselves
+        mode = "sendfile"
+    offload = mode != "sendfile"
+    resp = werkzeug_send_file(path, request.environ, use_x_sendfile=offload, response_class=app.response_class, **kwargs)
+    if mode == "x-accel-redirect":
+        resp.headers.pop("X-Sendfile", None)
+        # like werkzeug with X-Sendfile, never hand a 304 to the proxy or it streams the file anyway
+        if resp.status_code in (200, 206):
+            rel = os.path.relpath(path, data_dir).replace(os.sep, "/")
+            resp.headers["X-Accel-Redirect"] = X_ACCEL_PREFIX.rstrip("/") + "/" + quote(rel)
+    if offload:
+        # the proxy sends the body; don't advertise the file size on our empty response
+        resp.headers.pop("Content-Length", None)
+    return resp
+
 # Users and history live under DATA_DIR
 USERS_PATH = os.path.join(DATA_DIR, "users.json")
 
@@ -280,16 +324,47 @@ def next_invoice_number_for_user(username, manual=None):
     # Fallback if user not found
     return str(manual or 1000)
 
+def prepared_logo_path(logo_path):
+    # Scale the logo down to LOGO_BOX at LOGO_DPI once and reuse it until the source changes
+    if logo_path != DEFAULT_LOGO_PATH:
+        return logo_path
+    # the print copy carries the source's mtime, so any replacement (even with an older mtime) rebuilds it
+    st = os.stat(logo_path)
+    if os.path.exists(PRINT_LOGO_PATH) and os.stat(PRINT_LOGO_PATH).st_mtime_ns == st.st_mtime_ns:
+        return PRINT_LOGO_PATH
+    try:
+        with PILImage.open(logo_path) as src:
+            src.load()
+            px = tuple(int(round(pt / 72 * LOGO_DPI)) for pt in LOGO_BOX)
+            im = src.convert("RGBA")
+            im.thumbnail(px, PILImage.LANCZOS)
+            # flatten onto the white page so the PDF needs no separate alpha mask
+            flat = PILImage.new("RGB", im.size, "white")
+            flat.paste(im, mask=im.getchannel("A"))
+        # unique temp name per call: concurrent first renders (threads or workers) must not share it
+        fd, tmp = tempfile.mkstemp(suffix=".tmp", dir=UPLOAD_DIR)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                flat.save(f, "PNG", optimize=True)
+            os.utime(tmp, ns=(st.st_atime_ns, st.st_mtime_ns))
+            os.replace(tmp, PRINT_LOGO_PATH)
+        except Exception:
+            if os.path.exists(tmp): os.remove(tmp)
+            raise
+        return PRINT_LOGO_PATH
+    except Exception:
+        return logo_path
+
 def make_invoice_pdf(company_name, invoice, items, logo_path=None, currency="PKR"):
     buf = BytesIO()
-    doc = SimpleDocTemplate(buf, pagesize=A4, rightMargin=24, leftMargin=24, topMargin=24, bottomMargin=24)
+    doc = SimpleDocTemplate(buf, pagesize=A4, rightMargin=24, leftMargin=24, topMargin=24, bottomMargin=24, pageCompression=1)
     styles = getSampleStyleSheet()
     title_style = ParagraphStyle('title', parent=styles['Title'], alignment=TA_CENTER, fontSize=20, leading=24, spaceAfter=6)
     tiny = ParagraphStyle('tiny', parent=styles['Normal'], fontSize=8)
     story = []
     if logo_path and os.path.exists(logo_path):
         try:
-            im = Image(logo_path, width=40*mm, height=15*mm, kind='proportional')
+            im = Image(prepared_logo_path(logo_path), width=40*mm, height=15*mm, kind='proportional')
             story.append(im)
         except Exception:
             pass
@@ -491,7 +566,7 @@ def serve_invoice(invoice_no):
     if not os.path.exists(pdf_path):
         flash("Invoice not found", "error")
         return redirect(url_for("index"))
-    resp = send_file(pdf_path, mimetype="application/pdf", as_attachment=False, download_name=f"{invoice_no}.pdf")
+    resp = deliver_file(pdf_path, mimetype="application/pdf", as_attachment=False, download_name=f"{invoice_no}.pdf")
     resp.headers["Content-Disposition"] = f'inline; filename="{invoice_no}.pdf"'
     resp.headers["Cache-Control"] = "no-store"
     return resp
@@ -607,11 +682,11 @@ def history_export():
     if fmt == "xlsx":
         path = os.path.join(DATA_DIR, fname + ".xlsx")
         export_history_xlsx(user["username"], path)
-        return send_file(path, as_attachment=True, download_name=fname + ".xlsx")
+        return deliver_file(path, as_attachment=True, download_name=fname + ".xlsx")
     else:
         path = os.path.join(DATA_DIR, fname + ".csv")
         export_history_csv(user["username"], path)
-        return send_file(path, as_attachment=True, download_name=fname + ".csv")
+        return deliver_file(path, as_attachment=True, download_name=fname + ".csv")
 
 @app.route("/loadsheets")
 @login_required
@@ -665,11 +740,11 @@ def loadsheets_download(ls_id, fmt):
         return redirect(url_for("loadsheets"))
     fmt = fmt.lower()
     if fmt == "pdf":
-        return send_file(item["pdf_path"], as_attachment=True, download_name=ls_id + ".pdf")
+        return deliver_file(item["pdf_path"], as_attachment=True, download_name=ls_id + ".pdf")
     if fmt == "csv":
-        return send_file(item["csv_path"], as_attachment=True, download_name=ls_id + ".csv")
+        return deliver_file(item["csv_path"], as_attachment=True, download_name=ls_id + ".csv")
     if fmt == "xlsx":
-        return send_file(item["xlsx_path"], as_attachment=True, download_name=ls_id + ".xlsx")
+        return deliver_file(item["xlsx_path"], as_attachment=True, download_name=ls_id + ".xlsx")
     flash("Unknown format.", "error")
     return redirect(url_for("loadsheets"))
 
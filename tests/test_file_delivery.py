@@ -0,0 +1,98 @@
+# Stands in for the front proxy: checks the headers deliver_file() hands to nginx / Apache
+import os, subprocess, sys
+import pytest
+import app as brando
+
+MODES = ("sendfile", "x-sendfile", "x-accel-redirect")
+PREFIX = "/internal/files"
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    d = tmp_path / "invoices"
+    monkeypatch.setattr(brando, "DATA_DIR", str(d))
+    monkeypatch.setattr(brando, "LOADSHEETS_DIR", str(d / "loadsheets"))
+    monkeypatch.setattr(brando, "USERS_PATH", str(d / "users.json"))
+    monkeypatch.setattr(brando, "X_ACCEL_PREFIX", PREFIX)
+    brando.load_users()
+    (d / "admin_1000.pdf").write_bytes(b"%PDF-1.4 invoice")
+    os.makedirs(d / "loadsheets")
+    ls_pdf = d / "loadsheets" / "admin ls #1.pdf"
+    ls_pdf.write_bytes(b"%PDF-1.4 load sheet")
+    brando.save_history("admin", {"items": [{"invoice_no": "1000", "customer_name": "Ali", "total": 100, "created_at": brando.human_now()}]})
+    brando.save_loadsheets("admin", {"items": [{"id": "ls1", "invoice_nos": ["1000"], "created_at": brando.human_now(), "pdf_path": str(ls_pdf)}]})
+    return d
+
+
+def client(mode, monkeypatch, login=True):
+    monkeypatch.setattr(brando, "FILE_DELIVERY", mode)
+    c = brando.app.test_client()
+    if login:
+        c.post("/login", data={"username": "admin", "password": "admin123"})
+    return c
+
+
+def export_path(data_dir):
+    return next(str(p) for p in data_dir.iterdir() if p.name.startswith("admin_history_"))
+
+
+@pytest.mark.parametrize("mode", MODES)
+@pytest.mark.parametrize("url", ["/invoice/1000", "/loadsheets/ls1/pdf", "/history/export"])
+def test_logged_in_delivery(data_dir, monkeypatch, mode, url):
+    resp = client(mode, monkeypatch).get(url)
+    assert resp.status_code == 200
+    path = {
+        "/invoice/1000": str(data_dir / "admin_1000.pdf"),
+        "/loadsheets/ls1/pdf": str(data_dir / "loadsheets" / "admin ls #1.pdf"),
+    }.get(url) or export_path(data_dir)
+    if mode == "sendfile":
+        assert "X-Sendfile" not in resp.headers and "X-Accel-Redirect" not in resp.headers
+        with open(path, "rb") as f:
+            assert resp.data == f.read()
+        return
+    assert resp.data == b""
+    if mode == "x-sendfile":
+        assert resp.headers["X-Sendfile"] == os.path.abspath(path)
+        assert "X-Accel-Redirect" not in resp.headers
+    else:
+        assert "X-Sendfile" not in resp.headers
+        uri = resp.headers["X-Accel-Redirect"]
+        assert uri.startswith(PREFIX + "/") and ".." not in uri
+        if url == "/loadsheets/ls1/pdf":
+            assert uri == PREFIX + "/loadsheets/admin%20ls%20%231.pdf"
+
+
+@pytest.mark.parametrize("mode", MODES)
+@pytest.mark.parametrize("url", ["/invoice/1000", "/loadsheets/ls1/pdf", "/history/export"])
+def test_anonymous_redirects_without_offload(data_dir, monkeypatch, mode, url):
+    resp = client(mode, monkeypatch, login=False).get(url)
+    assert resp.status_code == 302
+    assert "/login" in resp.headers["Location"]
+    assert "X-Sendfile" not in resp.headers and "X-Accel-Redirect" not in resp.headers
+
+
+@pytest.mark.parametrize("mode", ["x-sendfile", "x-accel-redirect"])
+def test_not_modified_is_not_offloaded(data_dir, monkeypatch, mode):
+    c = client(mode, monkeypatch)
+    etag = c.get("/loadsheets/ls1/pdf").headers["ETag"]
+    resp = c.get("/loadsheets/ls1/pdf", headers={"If-None-Match": etag})
+    assert resp.status_code == 304
+    assert "X-Sendfile" not in resp.headers and "X-Accel-Redirect" not in resp.headers
+
+
+def test_accel_outside_data_dir_falls_back_to_sendfile(data_dir, tmp_path, monkeypatch):
+    moved = tmp_path / "old_install" / "admin_loadsheet.pdf"
+    os.makedirs(moved.parent)
+    moved.write_bytes(b"%PDF-1.4 moved")
+    brando.save_loadsheets("admin", {"items": [{"id": "ls1", "invoice_nos": ["1000"], "created_at": brando.human_now(), "pdf_path": str(moved)}]})
+    resp = client("x-accel-redirect", monkeypatch).get("/loadsheets/ls1/pdf")
+    assert resp.status_code == 200
+    assert "X-Accel-Redirect" not in resp.headers and "X-Sendfile" not in resp.headers
+    assert resp.data == b"%PDF-1.4 moved"
+
+
+def test_unknown_mode_fails_at_import():
+    env = dict(os.environ, BRANDO_FILE_DELIVERY="nginx")
+    proc = subprocess.run([sys.executable, "-c", "import app"], cwd=os.path.dirname(brando.__file__) or ".", env=env, capture_output=True, text=True)
+    assert proc.returncode != 0
+    assert "BRANDO_FILE_DELIVERY" in proc.stderr
@@ -0,0 +1,55 @@
+import os, re, shutil, threading
+import pytest
+from PIL import Image as PILImage
+import app as brando
+
+REPO_LOGO = os.path.join(os.path.dirname(brando.__file__), "static", "uploads", "logo.png")
+
+
+@pytest.fixture
+def logo(tmp_path, monkeypatch):
+    src = tmp_path / "logo.png"
+    shutil.copy(REPO_LOGO, src)
+    monkeypatch.setattr(brando, "UPLOAD_DIR", str(tmp_path))
+    monkeypatch.setattr(brando, "DEFAULT_LOGO_PATH", str(src))
+    monkeypatch.setattr(brando, "PRINT_LOGO_PATH", str(tmp_path / "logo.print.png"))
+    return src
+
+
+def box_px():
+    return tuple(round(pt / 72 * brando.LOGO_DPI) for pt in brando.LOGO_BOX)
+
+
+def test_concurrent_first_renders_share_one_print_logo(logo, tmp_path):
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(brando.prepared_logo_path(str(logo)))) for _ in range(8)]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    assert results == [brando.PRINT_LOGO_PATH] * 8
+    assert sorted(os.listdir(tmp_path)) == ["logo.png", "logo.print.png"]
+    with PILImage.open(brando.PRINT_LOGO_PATH) as im:
+        assert im.mode == "RGB" and im.width <= box_px()[0] and im.height <= box_px()[1]
+
+
+def test_replaced_logo_with_older_mtime_is_rebuilt(logo):
+    PILImage.new("RGB", (600, 200), "red").save(logo)
+    assert brando.prepared_logo_path(str(logo)) == brando.PRINT_LOGO_PATH
+    with PILImage.open(brando.PRINT_LOGO_PATH) as im:
+        assert im.getpixel((0, 0)) == (255, 0, 0)
+    # e.g. rsync -a / cp -p of a logo made yesterday
+    st = os.stat(logo)
+    PILImage.new("RGB", (600, 200), "blue").save(logo)
+    os.utime(logo, ns=(st.st_atime_ns, st.st_mtime_ns - 86400 * 10**9))
+    assert brando.prepared_logo_path(str(logo)) == brando.PRINT_LOGO_PATH
+    with PILImage.open(brando.PRINT_LOGO_PATH) as im:
+        assert im.getpixel((0, 0)) == (0, 0, 255)
+
+
+def test_invoice_embeds_print_sized_logo(logo):
+    meta = {"invoice_no": "1000", "customer_name": "Ali", "customer_address": "Lahore", "phone_primary": "03001234567", "date": brando.human_now()}
+    pdf = brando.make_invoice_pdf(brando.COMPANY_NAME, meta, [{"name": "Shirt", "price": "1200"}], logo_path=str(logo)).getvalue()
+    assert os.path.exists(brando.PRINT_LOGO_PATH)
+    images = [d for d in re.findall(rb"<<[^<>]*>>", pdf) if b"/Subtype /Image" in d]
+    widths = [int(re.search(rb"/Width (\d+)", d).group(1)) for d in images]
+    assert widths and max(widths) <= box_px()[0]
+    assert len(pdf) < os.path.getsize(REPO_LOGO) / 4